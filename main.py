@@ -1,82 +1,225 @@
 import numpy as np
 from model import HouseParams, AttackParams, PADM_Params
 from model import Control
-import matplotlib.pyplot as plt
-
-
-PV_availabilities = np.loadtxt("time_series/TS_PVAvail.csv")
-demands = np.loadtxt("time_series/TS_Demand.csv")
-PV_availabilities = PV_availabilities[0:24]
-demands = demands[0:24]
-
-house_params = HouseParams(
-    life_time=12*10*30*4,
-    price_PV = 1000,
-    price_battery = 140,
-    cost_buy = 0.25,
-    sell_price = 0.05,
-    total_demand = 3500,
-    demands= demands,
-    PV_availabilities= PV_availabilities
-)
-
-ub = 0.8
-lb = -0.8
-attack_params = AttackParams(ub=ub,lb=lb,capacity_battery=1)
-PADM_params = PADM_Params()
-
-control = Control(house_params, attack_params)
-print(50*"-")
-control.primal_model()
-print(50*"-")
-# control.dual_model()
-print(50*"-")
-# output = control.bigM_attack(100000)
-# print(50*"-")
-output = control.sos_attack()
-# print(50*"-")
-# control.sos_valid_ineq_attack()
-# control.PADM_attack(PADM_params)
-
-
-# prepare data for visualization
-demands = np.array(output["demands"])
-changed_demands = np.array(output["changed_demands"])
-demands_ub = demands * (1+ub)
-demands_lb = demands * (1+lb)
-
-
-
-# plot
-f = plt.figure(1)
-plt.subplot(4,1,1)
-x = range(len(demands))
-plt.plot( x, demands, color="blue", alpha=0.2, label="demands")
-# plt.plot(x, demands, color="blue", alpha=0.2)
-plt.plot( x, changed_demands, color="red", alpha=0.2, label="changed demands")
-plt.plot(x, demands_ub, color="green", linestyle="dashed", alpha=0.1)
-plt.plot(x, demands_lb, color="green", linestyle="dashed", alpha=0.1)
-plt.ylabel("Demand(kWh)")
-plt.title("Demand Curve")
-plt.subplot(4,1,2)
-plt.plot(x, output["PV"], color="blue", alpha=0.2)
-plt.ylabel("PV(kWh)")
-plt.subplot(4,1,3)
-plt.plot(x, output["battery"], color="blue", alpha=0.2)
-plt.ylabel("Battery(kWh)")
-plt.subplot(4,1,4)
-plt.plot(x, output["buy"], color="blue", alpha=0.2)
-plt.ylabel("Buy(kWh)")
-
-
-g = plt.figure(2)
-x = range(len(demands))
-plt.plot( x, demands, color="blue", alpha=0.2, label="demands")
-# plt.plot(x, demands, color="blue", alpha=0.2)
-plt.plot( x, changed_demands, color="red", alpha=0.2, label="changed demands")
-plt.plot(x, demands_ub, color="green", linestyle="dashed", alpha=0.1)
-plt.plot(x, demands_lb, color="green", linestyle="dashed", alpha=0.1)
-plt.ylabel("Demand(kWh)")
-plt.title("Demand Curve")
-plt.legend()
-plt.show()
\ No newline at end of file
+import os
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BIG_M = 100000 # M of the bigM attack when the data gives no estimate
+
+
+def _load_ts(path, hours):
+    # parsing the csv is slow, so only the first `hours` rows are parsed and they are kept
+    # as a binary .npy next to the csv; the cache is rebuilt when a longer horizon is asked for
+    cache = path + ".npy"
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+        values = np.load(cache, mmap_mode="r")
+        if len(values) >= hours:
+            # a copy, so the returned series does not keep the whole memory map alive
+            return values[:hours].copy()
+        del values
+    values = np.loadtxt(path, max_rows=hours, dtype=np.float64)
+    np.save(cache, values)
+    return values
+
+
+def reduce_ts(demands, PV_availabilities, eps):
+    # both series are rounded to a grid of eps times their maximum and consecutive hours in which
+    # neither of them changes are merged into one period carrying the energy of all its hours
+    rounded = []
+    for values in (demands, PV_availabilities):
+        step = eps * values.max()
+        rounded.append(np.round(values / step) * step if step > 0 else np.asarray(values))
+    changes = np.flatnonzero((np.diff(rounded[0]) != 0) | (np.diff(rounded[1]) != 0)) + 1
+    starts = np.concatenate(([0], changes))
+    durations = np.diff(np.append(starts, len(demands)))
+    return rounded[0][starts] * durations, rounded[1][starts] * durations, durations
+
+
+def build_house_params(hours_num, reduce_eps=None):
+    PV_availabilities = _load_ts("time_series/TS_PVAvail.csv", hours_num)
+    demands = _load_ts("time_series/TS_Demand.csv", hours_num)
+    durations = None
+    if reduce_eps is not None:
+        demands, PV_availabilities, durations = reduce_ts(demands, PV_availabilities, reduce_eps)
+        logger.info("%d hours are reduced to %d periods", hours_num, len(durations))
+    return HouseParams(
+        life_time=12*10*30*4,
+        price_PV = 1000,
+        price_battery = 140,
+        cost_buy = 0.25,
+        sell_price = 0.05,
+        total_demand = 3500,
+        demands= demands,
+        PV_availabilities= PV_availabilities,
+        durations= durations
+    )
+
+
+def estimate_big_m(house_params, ub, lb):
+    # no flow of the house exceeds the demand of the whole horizon under the largest attack,
+    # and the PV capacity does not need to deliver more than that in its weakest sunny hour
+    # without any sunny hour the PV capacity is not bounded this way, so the constant M is used
+    PV_availabilities = house_params.PV_availabilities
+    sunny = PV_availabilities[PV_availabilities > 0]
+    if sunny.size == 0:
+        return float(DEFAULT_BIG_M)
+    peak_demand = house_params.demands.max() * house_params.total_demand * (1 + max(abs(ub), abs(lb)))
+    total_energy = peak_demand * house_params.hours_num
+    return float(total_energy / sunny.min())
+
+
+def _plot_demand(ax, x, demands, changed_demands, bounds):
+    # the four curves are drawn by one call and styled afterwards
+    lines = ax.plot(x, np.column_stack((demands, changed_demands, bounds.T)))
+    styles = (("blue", 0.2, "solid"), ("red", 0.2, "solid"), ("green", 0.1, "dashed"), ("green", 0.1, "dashed"))
+    for line, (color, alpha, linestyle) in zip(lines, styles):
+        line.set_color(color)
+        line.set_alpha(alpha)
+        line.set_linestyle(linestyle)
+    lines[0].set_label("demands")
+    lines[1].set_label("changed demands")
+    ax.set_ylabel("Demand(kWh)")
+    ax.set_title("Demand Curve")
+
+
+def plot_result(output, ub, lb, save_fig=None):
+    # pyplot is imported here so that its import cost is not paid before the solve or without a plot
+    import matplotlib
+    if save_fig is not None:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    # prepare data for visualization
+    demands = output["demands"]
+    x = np.arange(len(demands), dtype=np.int32)
+    changed_demands = output["changed_demands"]
+    bounds = np.multiply.outer(np.array([1+ub, 1+lb]), demands) # rows are the upper and the lower bound
+
+    # plot
+    fig, axes = plt.subplots(4, 1, sharex=True, constrained_layout=True)
+    _plot_demand(axes[0], x, demands, changed_demands, bounds)
+    axes[0].legend()
+    for ax, key, label in zip(axes[1:], ("PV", "battery", "buy"), ("PV(kWh)", "Battery(kWh)", "Buy(kWh)")):
+        ax.plot(x, output[key], color="blue", alpha=0.2)
+        ax.set_ylabel(label)
+    if save_fig is None:
+        plt.show()
+    else:
+        fig.savefig(save_fig)
+
+
+def run_attack(control, attack, big_m):
+    if attack in ("bigM", "lazyBigM"):
+        ub, lb = control.attack_params.ub, control.attack_params.lb
+        big_m = big_m if big_m is not None else estimate_big_m(control.house_params, ub, lb)
+        return control.bigM_attack(big_m) if attack == "bigM" else control.lazy_bigM_attack(big_m)
+    if attack == "sd":
+        return control.sd_attack()
+    if attack == "indicator":
+        return control.indicator_attack()
+    return control.sos_attack()
+
+
+def solve_one(house_params, attack, big_m, solver_params, ub, lb, capacity_battery):
+    attack_params = AttackParams(ub=ub, lb=lb, capacity_battery=capacity_battery)
+    return run_attack(Control(house_params, attack_params, solver_params), attack, big_m)
+
+
+def sweep(house_params, attack, big_m, solver_params, param_grid, jobs):
+    # the attacks of the grid are independent models, so they are solved in separate processes
+    # and the gurobi threads are shared among them unless they are set explicitly,
+    # the logs of parallel solves interleave, so they are off unless asked for
+    solver_params = {"Threads": max(1, (os.cpu_count() or 1) // jobs), "OutputFlag": 0, **solver_params}
+    with ProcessPoolExecutor(jobs) as executor:
+        futures = [executor.submit(solve_one, house_params, attack, big_m, solver_params, *params) for params in param_grid]
+        return [future.result() for future in futures]
+
+
+def _sweep_point(text):
+    ub, lb, capacity_battery = (float(value) for value in text.split(","))
+    return ub, lb, capacity_battery if capacity_battery >= 0 else None
+
+
+def _positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"{text} is not a positive number")
+    return value
+
+
+def _param_value(text):
+    # gurobi takes an int or a float for a double parameter but only an int for an int parameter,
+    # values that are no number are string parameters like LogFile
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="adversarial attack on the demand of a house")
+    parser.add_argument("--attack", choices=("bigM", "lazyBigM", "indicator", "sos", "sd"), default="sos", help="reformulation of the lower level, lazyBigM separates the bigM constraints in a callback, indicator needs no M and sd uses strong duality")
+    parser.add_argument("--big-m", type=float, help="M of the bigM attack, estimated from the data by default")
+    parser.add_argument("--skip-primal", action="store_true", help="do not solve the primal model before the attack")
+    parser.add_argument("--ub", type=float, default=0.8, help="upper bound of the relative demand change")
+    parser.add_argument("--lb", type=float, default=-0.8, help="lower bound of the relative demand change")
+    parser.add_argument("--capacity-battery", type=float, default=1, help="fixed battery capacity, negative leaves it free")
+    parser.add_argument("--no-plot", action="store_true", help="do not plot the result")
+    parser.add_argument("--save-fig", help="save the plot to this file instead of showing it")
+    parser.add_argument("--threads", type=int, help="number of threads used by gurobi")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE", help="gurobi parameter, can be repeated")
+    parser.add_argument("--reduce-eps", type=float, help="merge hours whose values agree up to this relative precision")
+    parser.add_argument("--debug-names", action="store_true", help="name the gurobi variables and constraints")
+    parser.add_argument("--verbose", action="store_true", help="log the demand curves of the result and the PADM iterations")
+    parser.add_argument("--sweep", type=_sweep_point, action="append", metavar="UB,LB,CAPACITY", help="solve the attack for these parameters instead, can be repeated")
+    parser.add_argument("--jobs", type=_positive_int, default=os.cpu_count() or 1, help="number of processes used by --sweep")
+    return parser.parse_args()
+
+
+def main(args):
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    np.set_printoptions(precision=3, suppress=True)
+
+    house_params = build_house_params(24, args.reduce_eps)
+    solver_params = {}
+    if args.threads is not None:
+        solver_params["Threads"] = args.threads
+    for param in args.param:
+        name, value = param.split("=", 1)
+        solver_params[name] = _param_value(value)
+
+    if args.sweep:
+        results = sweep(house_params, args.attack, args.big_m, solver_params, args.sweep, args.jobs)
+        for (ub, lb, capacity_battery), output in zip(args.sweep, results):
+            change = np.abs(output["changed_demands"] - output["demands"]).sum()
+            logger.info("ub=%s lb=%s capacity_battery=%s: total demand change %.4f kWh", ub, lb, capacity_battery, change)
+        return
+
+    capacity_battery = args.capacity_battery if args.capacity_battery >= 0 else None
+    control = Control(house_params, AttackParams(ub=args.ub, lb=args.lb, capacity_battery=capacity_battery), solver_params, debug_names=args.debug_names)
+    PADM_params = PADM_Params(verbose=args.verbose)
+    if not args.skip_primal:
+        print(50*"-")
+        control.primal_model()
+    print(50*"-")
+    # control.dual_model()
+    output = run_attack(control, args.attack, args.big_m)
+    # control.sos_valid_ineq_attack()
+    # control.PADM_attack(PADM_params)
+    logger.debug("demands=%s", output["demands"])
+    logger.debug("changed demands=%s", output["changed_demands"])
+
+    if not args.no_plot:
+        plot_result(output, args.ub, args.lb, args.save_fig)
+
+
+if __name__ == "__main__":
+    # only this script's logger gets a handler, gurobipy already writes its log to the console
+    logger.addHandler(logging.StreamHandler())
+    main(parse_args())
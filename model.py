@@ -1,9 +1,40 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import lru_cache
 import gurobipy as gp
 from gurobipy import GRB
 import numpy as np
-
-@dataclass(frozen=True)
+if gp.gurobi.version() < (10, 0, 0): # the model is built with the matrix api, MVar.fromvar and addLConstr
+    raise ImportError(f"gurobipy >= 10.0 is required, found {'.'.join(map(str, gp.gurobi.version()))}")
+try:
+    from numba import njit
+except ImportError: # numba is optional, without it the numeric helpers run as plain python
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+@njit(cache=True)
+def _demand_coeffs(demands: np.ndarray, total_demand: float, factors: np.ndarray) -> np.ndarray:
+    # coefficient of the demand of hour i in the model, demands[i] * total_demand * factors[i]
+    coeffs = np.empty(demands.shape[0])
+    for i in range(demands.shape[0]):
+        coeffs[i] = demands[i] * total_demand * factors[i]
+    return coeffs
+
+@njit(cache=True)
+def _max_abs_diff(values_A: np.ndarray, values_B: np.ndarray) -> float:
+    # largest absolute difference of two arrays of the same shape, 0 for empty ones
+    max_diff = 0.0
+    for i in range(values_A.shape[0]):
+        max_diff = max(max_diff, abs(values_A[i] - values_B[i]))
+    return max_diff
+
+@lru_cache
+def _prev_hours(hours_num: int) -> np.ndarray:
+    # the hour before each hour, the first follows the last; shared by all models of a horizon, so read-only
+    prev = np.roll(np.arange(hours_num), 1)
+    prev.flags.writeable = False
+    return prev
+
+@dataclass(frozen=True, slots=True)
 class HouseParams:
     life_time: int
     price_PV: float
@@ -11,22 +42,26 @@ class HouseParams:
     cost_buy: float
     sell_price: float
     total_demand: float
-    demands: list[float]
-    PV_availabilities: list[float]
-    
-    @property
-    def cost_PV(self):
-        return self.price_PV/self.life_time
-    
-    @property
-    def cost_battery(self):
-        return self.price_battery/self.life_time
-    
-    @property
-    def hours_num(self):
-        return len(self.demands)
-
-@dataclass(frozen=True)
+    demands: np.ndarray
+    PV_availabilities: np.ndarray
+    durations: np.ndarray|None = None # hours in each period of a reduced series, None for one hour each
+    scaled_demands: np.ndarray = field(init=False, repr=False) # demands * total_demand, the demand of each hour in the model
+    cost_PV: float = field(init=False, repr=False) # yearly cost of one unit of PV capacity
+    cost_battery: float = field(init=False, repr=False) # yearly cost of one unit of battery capacity
+    hours_num: int = field(init=False, repr=False)
+
+    def __post_init__(self):
+        # lists are accepted as well, the model works on float arrays
+        object.__setattr__(self, "demands", np.ascontiguousarray(self.demands, dtype=np.float64))
+        object.__setattr__(self, "PV_availabilities", np.ascontiguousarray(self.PV_availabilities, dtype=np.float64))
+        object.__setattr__(self, "hours_num", self.demands.shape[0])
+        durations = np.ones(self.hours_num) if self.durations is None else np.ascontiguousarray(self.durations, dtype=np.float64)
+        object.__setattr__(self, "durations", durations)
+        object.__setattr__(self, "scaled_demands", _demand_coeffs(self.demands, self.total_demand, np.ones(self.hours_num)))
+        object.__setattr__(self, "cost_PV", self.price_PV/self.life_time)
+        object.__setattr__(self, "cost_battery", self.price_battery/self.life_time)
+
+@dataclass(frozen=True, slots=True)
 class AttackParams:
     capacity_battery: float|None = None
     capacity_PV: float|None = None
@@ -36,7 +71,7 @@ class AttackParams:
     total_delta_ub: float = GRB.INFINITY
     
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PADM_Params:
     initial_mu: float = 1
     increase_factor: float = 2
@@ -44,492 +79,513 @@ class PADM_Params:
     max_stationary_iter: int = 200
     stationary_error: float = 1e-4
     penalty_error: float = 1e-4
+    theta: float = 0 # the penalty is kept while the duality gap shrinks below theta times the previous one, 0 always increases it
+    momentum: float = 0 # the start of a subproblem is extrapolated by momentum times the last step of the iterates
+    verbose: bool = False # print the counters of the penalty and the inner loop
+
+# gurobi parameters suited to each kind of model, the solver_params given to HouseModel take precedence
+MODEL_PARAMS = {
+    "LP": {"Method": 2, "Crossover": 0, "Presolve": 2, "Threads": 1},
+    # LPs solved one after another with only the objective changed, primal simplex restarts from the last basis
+    "LP_sequence": {"Method": 0, "Presolve": 0, "Threads": 1},
+    "MILP": {"MIPFocus": 1, "Heuristics": 0.05, "Cuts": 2},
+    # the strong duality constraint is a nonconvex quadratic one, which gurobi 10 only solves with NonConvex=2
+    "MIQCP": {"MIPFocus": 1, "Heuristics": 0.05, "Cuts": 2, "NonConvex": 2},
+}
 
 class HouseModel():
-    def __init__(self, house_params: HouseParams, attack_params: AttackParams):       
+    def __init__(self, house_params: HouseParams, attack_params: AttackParams, solver_params: dict[str, float|int|str]|None = None, debug_names: bool = False):       
         self.house_params = house_params
+        self.debug_names = debug_names # names make the model readable in written lp files but cost a string per row and column
         self.attack_params = attack_params
         self.model = gp.Model("HouseModel")
+        self.demands = house_params.demands
+        self.scaled_demands = house_params.scaled_demands
+        self.PV_availabilities = house_params.PV_availabilities
+        self.prev_hours = _prev_hours(house_params.hours_num)
+        self.solver_params = solver_params if solver_params is not None else {}
+        for key, value in self.solver_params.items():
+            self.model.setParam(key, value)
         self.vars = {}
         self.obj = {} # to keep objective function expressions
         self.constrs = {}
-        self.constrs["fix"] = {} # to keep the variable fixing constraints
+        self.constrs["fix"] = {} # original bounds of the fixed variables
+        self._valid_ineq_hour = None # hour whose delta is the current objective of set_valid_ineq_obj
+        self._cs_mode = None # reformulation of the complementarity conditions, a model gets only one
+
+    def configure(self, kind: str) -> None:
+        params = dict(MODEL_PARAMS[kind])
+        if kind in ("MILP", "MIQCP") and self.attack_params.norm == 2:
+            params["Method"] = 2 # the relaxations are second order cone programs, which only barrier solves
+        for key, value in params.items():
+            if key not in self.solver_params:
+                self.model.setParam(key, value)
+
+    def _name(self, name: str) -> str:
+        # gurobi generates no names for an empty string
+        return name if self.debug_names else ""
 
     def add_vars(self) -> None:
-        # upper level
+        # all variable groups, the models without complementarity binaries add only the groups they use
+        self.add_upper_level_vars()
+        self.add_primal_vars()
+        self.add_dual_vars()
+        self.add_aux_vars()
+        self.add_cs_vars()
+
+    def add_upper_level_vars(self) -> None:
+        H = self.house_params.hours_num
         self.vars["upper_level"] = {}
-        self.vars["upper_level"]["delta"] = self.model.addVars(self.house_params.hours_num, vtype= GRB.CONTINUOUS, name="delta",lb=self.attack_params.lb,ub=self.attack_params.ub)
-        self.vars["upper_level"]["abs"] = self.model.addVars(self.house_params.hours_num, vtype= GRB.CONTINUOUS, name="abs",lb=-GRB.INFINITY)
-        
-        # primal
+        self.vars["upper_level"]["delta"] = self.model.addMVar(H, vtype= GRB.CONTINUOUS, name=self._name("delta"),lb=self.attack_params.lb,ub=self.attack_params.ub)
+        self.vars["upper_level"]["abs"] = self.model.addMVar(H, vtype= GRB.CONTINUOUS, name=self._name("abs"),lb=-GRB.INFINITY)
+        if self.attack_params.norm == 2:
+            self.vars["upper_level"]["norm"] = self.model.addVar(name=self._name("norm")) # epigraph of the 2-norm of delta
+            if np.any(self.house_params.durations != 1):
+                # a period of k hours counts k times in the 2-norm of the whole series, so its delta is scaled by sqrt(k)
+                self.vars["upper_level"]["weighted_delta"] = self.model.addMVar(H, name=self._name("weighted_delta"), lb=-GRB.INFINITY)
+        # the changed demand of every hour, right hand side of eq_demand and coefficients of the dual objective
+        self.changed_demands = self.scaled_demands + self.scaled_demands * self.vars["upper_level"]["delta"]
+
+    def add_primal_vars(self) -> None:
+        H = self.house_params.hours_num
         self.vars["primal"] = {}
-        self.vars["primal"]["energy_PV"] = self.model.addVars(self.house_params.hours_num, name="energy_PV")
-        self.vars["primal"]["energy_battery"] = self.model.addVars(self.house_params.hours_num, name="energy_battery")
-        self.vars["primal"]["energy_battery_in"] = self.model.addVars(self.house_params.hours_num, name="energy_battery_in")
-        self.vars["primal"]["energy_battery_out"] = self.model.addVars(self.house_params.hours_num, name="energy_battery_out")
-        self.vars["primal"]["energy_buy"] = self.model.addVars(self.house_params.hours_num, name="energy_buy")
-        self.vars["primal"]["energy_sell"] = self.model.addVars(self.house_params.hours_num, name="energy_sell")
-        self.vars["primal"]["capacity_battery"] = self.model.addVar(name="capacity_battery")
-        self.vars["primal"]["capacity_PV"] = self.model.addVar(name="capacity_PV")
-        
-        # dual
-        self.vars["dual"] = {} 
-        self.vars["dual"]["limit_battery"] = self.model.addVars(self.house_params.hours_num, name="limit_battery", lb=-GRB.INFINITY, ub=0)
-        self.vars["dual"]["limit_PV"] = self.model.addVars(self.house_params.hours_num, name="limit_PV", lb=-GRB.INFINITY, ub=0)
-        self.vars["dual"]["eq_battery"] = self.model.addVars(self.house_params.hours_num, name="eq_battery", lb=-GRB.INFINITY)
-        self.vars["dual"]["eq_demand"] = self.model.addVars(self.house_params.hours_num, name="eq_demand", lb=-GRB.INFINITY)
-        
+        self.vars["primal"]["energy_PV"] = self.model.addMVar(H, name=self._name("energy_PV"))
+        self.vars["primal"]["energy_battery"] = self.model.addMVar(H, name=self._name("energy_battery"))
+        self.vars["primal"]["energy_battery_in"] = self.model.addMVar(H, name=self._name("energy_battery_in"))
+        self.vars["primal"]["energy_battery_out"] = self.model.addMVar(H, name=self._name("energy_battery_out"))
+        self.vars["primal"]["energy_buy"] = self.model.addMVar(H, name=self._name("energy_buy"))
+        self.vars["primal"]["energy_sell"] = self.model.addMVar(H, name=self._name("energy_sell"))
+        self.vars["primal"]["capacity_battery"] = self.model.addVar(name=self._name("capacity_battery"))
+        self.vars["primal"]["capacity_PV"] = self.model.addVar(name=self._name("capacity_PV"))
+
+    def add_dual_vars(self) -> None:
+        H = self.house_params.hours_num
+        self.vars["dual"] = {}
+        self.vars["dual"]["limit_battery"] = self.model.addMVar(H, name=self._name("limit_battery"), lb=-GRB.INFINITY, ub=0)
+        self.vars["dual"]["limit_PV"] = self.model.addMVar(H, name=self._name("limit_PV"), lb=-GRB.INFINITY, ub=0)
+        self.vars["dual"]["eq_battery"] = self.model.addMVar(H, name=self._name("eq_battery"), lb=-GRB.INFINITY)
+        # the dual constraints of energy_buy and energy_sell only bound eq_demand, so they are its bounds
+        self.vars["dual"]["eq_demand"] = self.model.addMVar(H, name=self._name("eq_demand"), lb=self.house_params.sell_price, ub=self.house_params.cost_buy)
+
+
+    def add_aux_vars(self) -> None:
         # auxiliary variables for complementary slackness
         # positive variables and positive slacks of the constraints
+        H = self.house_params.hours_num
         self.vars["aux"] = {}
-        self.vars["aux"]["limit_PV"] = self.model.addVars(self.house_params.hours_num, name="aux_limit_PV")
-        self.vars["aux"]["limit_battery"] = self.model.addVars(self.house_params.hours_num, name="aux_limit_battery")
-        self.vars["aux"]["slack_limit_PV"] = self.model.addVars(self.house_params.hours_num, name="slack_limit_PV")
-        self.vars["aux"]["slack_limit_battery"] = self.model.addVars(self.house_params.hours_num, name="slack_limit_battery")
-        self.vars["aux"]["slack_energy_buy"] = self.model.addVars(self.house_params.hours_num, name="slack_energy_buy")
-        self.vars["aux"]["slack_energy_sell"] = self.model.addVars(self.house_params.hours_num, name="slack_energy_sell")
-        self.vars["aux"]["slack_energy_battery_out"] = self.model.addVars(self.house_params.hours_num, name="slack_energy_battery_out")
-        self.vars["aux"]["slack_energy_battery_in"] = self.model.addVars(self.house_params.hours_num, name="slack_energy_battery_in")
-        self.vars["aux"]["slack_energy_battery"] = self.model.addVars(self.house_params.hours_num, name="slack_energy_battery")
-        self.vars["aux"]["slack_energy_PV"] = self.model.addVars(self.house_params.hours_num, name="slack_energy_PV")
-        self.vars["aux"]["slack_capacity_PV"] = self.model.addVar(name="slack_capacity_PV")
-        self.vars["aux"]["slack_capacity_battery"] = self.model.addVar(name="slack_capacity_battery")
-
-        # binary variables for complementary slackness constraints
+        self.vars["aux"]["limit_PV"] = self.model.addMVar(H, name=self._name("aux_limit_PV"))
+        self.vars["aux"]["limit_battery"] = self.model.addMVar(H, name=self._name("aux_limit_battery"))
+        self.vars["aux"]["slack_limit_PV"] = self.model.addMVar(H, name=self._name("slack_limit_PV"))
+        self.vars["aux"]["slack_limit_battery"] = self.model.addMVar(H, name=self._name("slack_limit_battery"))
+        self.vars["aux"]["slack_energy_buy"] = self.model.addMVar(H, name=self._name("slack_energy_buy"))
+        self.vars["aux"]["slack_energy_sell"] = self.model.addMVar(H, name=self._name("slack_energy_sell"))
+        self.vars["aux"]["slack_energy_battery_out"] = self.model.addMVar(H, name=self._name("slack_energy_battery_out"))
+        self.vars["aux"]["slack_energy_battery_in"] = self.model.addMVar(H, name=self._name("slack_energy_battery_in"))
+        self.vars["aux"]["slack_energy_battery"] = self.model.addMVar(H, name=self._name("slack_energy_battery"))
+        self.vars["aux"]["slack_energy_PV"] = self.model.addMVar(H, name=self._name("slack_energy_PV"))
+        self.vars["aux"]["slack_capacity_PV"] = self.model.addVar(name=self._name("slack_capacity_PV"))
+        self.vars["aux"]["slack_capacity_battery"] = self.model.addVar(name=self._name("slack_capacity_battery"))
+
+    def add_cs_vars(self) -> None:
+        # binary variables for complementary slackness constraints, only used by the bigM reformulation
+        H = self.house_params.hours_num
         self.vars["cs"] = {}
-        self.vars["cs"]["limit_PV"] = self.model.addVars(self.house_params.hours_num, vtype=GRB.BINARY, name="cs_limit_PV")
-        self.vars["cs"]["limit_battery"] = self.model.addVars(self.house_params.hours_num, vtype=GRB.BINARY, name="cs_limit_battery")
-        self.vars["cs"]["energy_buy"] = self.model.addVars(self.house_params.hours_num, vtype=GRB.BINARY, name="cs_energy_buy")
-        self.vars["cs"]["energy_sell"] = self.model.addVars(self.house_params.hours_num, vtype=GRB.BINARY, name="cs_energy_sell")
-        self.vars["cs"]["energy_battery_out"] = self.model.addVars(self.house_params.hours_num, vtype=GRB.BINARY, name="cs_energy_battery_out")
-        self.vars["cs"]["energy_battery_in"] = self.model.addVars(self.house_params.hours_num, vtype=GRB.BINARY, name="cs_energy_battery_in")
-        self.vars["cs"]["energy_battery"] = self.model.addVars(self.house_params.hours_num, vtype=GRB.BINARY, name="cs_energy_battery")
-        self.vars["cs"]["energy_PV"] = self.model.addVars(self.house_params.hours_num, vtype=GRB.BINARY, name="cs_energy_PV")
-        self.vars["cs"]["capacity_PV"] = self.model.addVar(vtype=GRB.BINARY, name="cs_limit_PV")
-        self.vars["cs"]["capacity_battery"] = self.model.addVar(vtype=GRB.BINARY, name="cs_limit_battery")
-        
-    def add_upper_level_constrs(self) -> None:
+        self.vars["cs"]["limit_PV"] = self.model.addMVar(H, vtype=GRB.BINARY, name=self._name("cs_limit_PV"))
+        self.vars["cs"]["limit_battery"] = self.model.addMVar(H, vtype=GRB.BINARY, name=self._name("cs_limit_battery"))
+        self.vars["cs"]["energy_buy"] = self.model.addMVar(H, vtype=GRB.BINARY, name=self._name("cs_energy_buy"))
+        self.vars["cs"]["energy_sell"] = self.model.addMVar(H, vtype=GRB.BINARY, name=self._name("cs_energy_sell"))
+        self.vars["cs"]["energy_battery_out"] = self.model.addMVar(H, vtype=GRB.BINARY, name=self._name("cs_energy_battery_out"))
+        self.vars["cs"]["energy_battery_in"] = self.model.addMVar(H, vtype=GRB.BINARY, name=self._name("cs_energy_battery_in"))
+        self.vars["cs"]["energy_battery"] = self.model.addMVar(H, vtype=GRB.BINARY, name=self._name("cs_energy_battery"))
+        self.vars["cs"]["energy_PV"] = self.model.addMVar(H, vtype=GRB.BINARY, name=self._name("cs_energy_PV"))
+        self.vars["cs"]["capacity_PV"] = self.model.addVar(vtype=GRB.BINARY, name=self._name("cs_limit_PV"))
+        self.vars["cs"]["capacity_battery"] = self.model.addVar(vtype=GRB.BINARY, name=self._name("cs_limit_battery"))
+
+    def add_upper_level_constrs(self, with_abs: bool = True) -> None:
+        # models that do not use the upper level objective can leave out the abs constraints
+        upper_level = self.vars["upper_level"]
         # constrainsts
         self.constrs["upper_level"] = {}
-        self.constrs["upper_level"]["demand_change"] = self.model.addConstr(
-            sum(self.vars["upper_level"]["delta"][i] * self.house_params.demands[i] for i in range(self.house_params.hours_num)) == 0,
-            name = "demand_change"
-        )
-        self.constrs["upper_level"]["abs"] = self.model.addConstrs(
-            (self.vars["upper_level"]["abs"][i] == gp.abs_(self.vars["upper_level"]["delta"][i]) for i in range(self.house_params.hours_num) ),
-            name = "abs"
-        )
-        
-        if self.attack_params.capacity_battery is not None:
-            self.constrs["upper_level"]["capacity_battery"] = self.model.addConstr(
-                self.attack_params.capacity_battery == self.vars["primal"]["capacity_battery"],
-                name = "capacity_battery_lb"
-            )
-        
-        if self.attack_params.capacity_PV is not None:
-            self.constrs["upper_level"]["capacity_PV"] = self.model.addConstr(
-                self.attack_params.capacity_PV == self.vars["primal"]["capacity_PV"],
-                name = "capacity_PV"
+        self.constrs["upper_level"]["demand_change"] = self.model.addLConstr(
+            gp.LinExpr(self.demands.tolist(), upper_level["delta"].tolist()) == 0,
+            name=self._name("demand_change")
+        )
+        if self.attack_params.norm == 2:
+            normed = upper_level["delta"]
+            if "weighted_delta" in upper_level:
+                self.constrs["upper_level"]["weighted_delta"] = self.model.addConstr(
+                    upper_level["weighted_delta"] == np.sqrt(self.house_params.durations) * upper_level["delta"],
+                    name=self._name("weighted_delta")
+                )
+                normed = upper_level["weighted_delta"]
+            self.constrs["upper_level"]["norm"] = self.model.addGenConstrNorm(
+                upper_level["norm"], normed, 2.0, name=self._name("norm")
             )
+        elif with_abs:
+            self._add_abs_constrs()
+        self._bound_total_delta(self.attack_params.total_delta_ub)
+        self._fix_capacity("capacity_battery", self.attack_params.capacity_battery)
+        self._fix_capacity("capacity_PV", self.attack_params.capacity_PV)
         
         # objective
-        self.obj["upper_level"] = sum(self.vars["upper_level"]["abs"][i]  for i in range(self.house_params.hours_num))
+        if self.attack_params.norm == 2:
+            self.obj["upper_level"] = gp.LinExpr(upper_level["norm"])
+        else:
+            # every hour of a period counts, so |delta| is weighted by the duration of its period
+            self.obj["upper_level"] = self.house_params.durations @ upper_level["abs"]
     
+    def _add_abs_constrs(self) -> None:
+        # abs is minimized, so bounding it from below by delta and -delta makes it |delta| at the optimum
+        # without that objective abs is only an upper bound of |delta|, which is enough to bound the total change
+        upper_level = self.vars["upper_level"]
+        if "abs" in self.constrs["upper_level"]:
+            return
+        self.constrs["upper_level"]["abs"] = {}
+        self.constrs["upper_level"]["abs"]["pos"] = self.model.addConstr(upper_level["abs"] >= upper_level["delta"], name=self._name("abs_pos"))
+        self.constrs["upper_level"]["abs"]["neg"] = self.model.addConstr(upper_level["abs"] >= - upper_level["delta"], name=self._name("abs_neg"))
+
+    def _bound_total_delta(self, value: float) -> None:
+        # sum of |delta| over the hours <= total_delta_ub, an infinite bound leaves the row out
+        constrs = self.constrs["upper_level"]
+        if value < GRB.INFINITY:
+            self._add_abs_constrs()
+        if "total_delta" in constrs:
+            if value < GRB.INFINITY:
+                constrs["total_delta"].RHS = value
+            else:
+                self.model.remove(constrs.pop("total_delta"))
+        elif value < GRB.INFINITY:
+            constrs["total_delta"] = self.model.addLConstr(
+                (self.house_params.durations @ self.vars["upper_level"]["abs"]).item(), GRB.LESS_EQUAL, value,
+                name=self._name("total_delta")
+            )
+
+    def _fix_capacity(self, key: str, value: float|None) -> None:
+        # a capacity given by the attack is fixed by an equality, None leaves it to the lower level
+        constrs = self.constrs["upper_level"]
+        if key in constrs:
+            if value is None:
+                self.model.remove(constrs.pop(key))
+            else:
+                constrs[key].RHS = value
+        elif value is not None:
+            constrs[key] = self.model.addLConstr(
+                self.vars["primal"][key], GRB.EQUAL, value,
+                name=self._name("capacity_battery_lb" if key == "capacity_battery" else key)
+            )
+
+    def apply_attack(self, attack_params: AttackParams) -> None:
+        # re-seeds a built model with other attack parameters, the norm changes its structure and has to stay
+        if attack_params.norm != self.attack_params.norm:
+            raise ValueError(f"the norm of a built model can't be changed from {self.attack_params.norm} to {attack_params.norm}")
+        self.attack_params = attack_params
+        self.vars["upper_level"]["delta"].LB = attack_params.lb
+        self.vars["upper_level"]["delta"].UB = attack_params.ub
+        if "upper_level" in self.constrs:
+            self._bound_total_delta(attack_params.total_delta_ub)
+            self._fix_capacity("capacity_battery", attack_params.capacity_battery)
+            self._fix_capacity("capacity_PV", attack_params.capacity_PV)
+
     def add_primal_constrs(self) -> None:
+        # every constraint family is a single matrix constraint over the hours
+        primal = self.vars["primal"]
         self.constrs["primal"] = {}
-        self.constrs["primal"]["eq_demand"] = self.model.addConstrs(
-            (
-                self.vars["primal"]["energy_buy"][i] -
-                self.vars["primal"]["energy_sell"][i] +
-                self.vars["primal"]["energy_battery_out"][i] -
-                self.vars["primal"]["energy_battery_in"][i] +
-                self.vars["primal"]["energy_PV"][i] == 
-                self.house_params.demands[i] * self.house_params.total_demand * (1 + self.vars["upper_level"]["delta"][i]) for i in range(self.house_params.hours_num)
-            ),
-            name="eq_demand"
+        self.constrs["primal"]["eq_demand"] = self.model.addConstr(
+            primal["energy_buy"] - primal["energy_sell"] + primal["energy_battery_out"] - primal["energy_battery_in"] + primal["energy_PV"] ==
+            self.changed_demands,
+            name=self._name("eq_demand")
         )
 
-        self.constrs["primal"]["eq_battery"] = self.model.addConstrs(
-            (
-                self.vars["primal"]["energy_battery"][range(self.house_params.hours_num)[i-1]] +
-                self.vars["primal"]["energy_battery_in"][i] -
-                self.vars["primal"]["energy_battery_out"][i] == 
-                self.vars["primal"]["energy_battery"][i]  for i in range(self.house_params.hours_num)
-            ),
-            name="eq_battery"
+        self.constrs["primal"]["eq_battery"] = self.model.addConstr(
+            primal["energy_battery"][self.prev_hours] + primal["energy_battery_in"] - primal["energy_battery_out"] == primal["energy_battery"],
+            name=self._name("eq_battery")
         )
 
-        self.constrs["primal"]["limit_PV"] = self.model.addConstrs(
-            (
-                self.vars["primal"]["energy_PV"][i] <= 
-                self.vars["primal"]["capacity_PV"] * self.house_params.PV_availabilities[i] for i in range(self.house_params.hours_num)
-            ),
-            name="limit_PV"
+        self.constrs["primal"]["limit_PV"] = self.model.addConstr(
+            primal["energy_PV"] <= gp.MVar.fromvar(primal["capacity_PV"]) * self.PV_availabilities,
+            name=self._name("limit_PV")
         )
 
-        self.constrs["primal"]["limit_battery"] = self.model.addConstrs(
-            (
-                self.vars["primal"]["energy_battery"][i] <= 
-                self.vars["primal"]["capacity_battery"] for i in range(self.house_params.hours_num)
-            ),
-            name="limit_battery"
+        self.constrs["primal"]["limit_battery"] = self.model.addConstr(
+            primal["energy_battery"] <= primal["capacity_battery"],
+            name=self._name("limit_battery")
         )
 
         # objective function
         self.obj["primal"] = (
-            self.house_params.cost_PV * self.vars["primal"]["capacity_PV"] +
-            self.house_params.cost_battery * self.vars["primal"]["capacity_battery"] +
-            self.house_params.cost_buy * sum(self.vars["primal"]["energy_buy"][i] for i in range(self.house_params.hours_num)) -
-            self.house_params.sell_price * sum(self.vars["primal"]["energy_sell"][i] for i in range(self.house_params.hours_num)) 
+            self.house_params.cost_PV * primal["capacity_PV"] +
+            self.house_params.cost_battery * primal["capacity_battery"] +
+            self.house_params.cost_buy * primal["energy_buy"].sum() -
+            self.house_params.sell_price * primal["energy_sell"].sum()
         )
 
     def add_dual_constrs(self) -> None:
+        dual = self.vars["dual"]
         self.constrs["dual"] = {}
 
-        self.constrs["dual"]["energy_buy"] = self.model.addConstrs(
-            (
-                self.vars["dual"]["eq_demand"][i] <= 
-                self.house_params.cost_buy for i in range(self.house_params.hours_num)
-            ),
-            name="energy_buy"
-        )
-        self.constrs["dual"]["energy_sell"] = self.model.addConstrs(
-            (
-                - self.vars["dual"]["eq_demand"][i] <= 
-                - self.house_params.sell_price for i in range(self.house_params.hours_num)
-            ),
-            name="energy_sell"
-        )
-        self.constrs["dual"]["energy_battery_out"] = self.model.addConstrs(
-            (self.vars["dual"]["eq_demand"][i] - self.vars["dual"]["eq_battery"][i]<= 0 for i in range(self.house_params.hours_num)),
-            name="energy_battery_out"
+        self.constrs["dual"]["energy_battery_out"] = self.model.addConstr(
+            dual["eq_demand"] - dual["eq_battery"] <= 0,
+            name=self._name("energy_battery_out")
         )
-        self.constrs["dual"]["energy_battery_in"] = self.model.addConstrs(
-            (- self.vars["dual"]["eq_demand"][i] + self.vars["dual"]["eq_battery"][i]<= 0 for i in range(self.house_params.hours_num)),
-            name="energy_battery_in"
+        self.constrs["dual"]["energy_battery_in"] = self.model.addConstr(
+            - dual["eq_demand"] + dual["eq_battery"] <= 0,
+            name=self._name("energy_battery_in")
         )
-        self.constrs["dual"]["energy_battery"] = self.model.addConstrs(
-            (
-                self.vars["dual"]["eq_battery"][i] -
-                self.vars["dual"]["eq_battery"][range(self.house_params.hours_num)[i-1]] + 
-                self.vars["dual"]["limit_battery"][range(self.house_params.hours_num)[i-1]] <= 
-                0 for i in range(self.house_params.hours_num)
-            ),
-            name="energy_battery"
+        self.constrs["dual"]["energy_battery"] = self.model.addConstr(
+            dual["eq_battery"] - dual["eq_battery"][self.prev_hours] + dual["limit_battery"][self.prev_hours] <= 0,
+            name=self._name("energy_battery")
         )
-        self.constrs["dual"]["energy_PV"] = self.model.addConstrs(
-            (
-                self.vars["dual"]["eq_demand"][i] +
-                self.vars["dual"]["limit_PV"][i] <= 
-                0 for i in range(self.house_params.hours_num)
-            ),
-            name="energy_PV"
+        self.constrs["dual"]["energy_PV"] = self.model.addConstr(
+            dual["eq_demand"] + dual["limit_PV"] <= 0,
+            name=self._name("energy_PV")
         )
-        self.constrs["dual"]["capacity_battery"] = self.model.addConstr(
-            sum(-self.vars["dual"]["limit_battery"][i] for i in range(self.house_params.hours_num))  <=  self.house_params.cost_battery,
-            name="capacity_battery"
+        self.constrs["dual"]["capacity_battery"] = self.model.addLConstr(
+            - dual["limit_battery"].sum().item() <= self.house_params.cost_battery,
+            name=self._name("capacity_battery")
         )
-        self.constrs["dual"]["capacity_PV"] = self.model.addConstr(
-            sum(-self.vars["dual"]["limit_PV"][i] * self.house_params.PV_availabilities[i] for i in range(self.house_params.hours_num))  <=  self.house_params.cost_PV,
-            name="capacity_PV"
+        self.constrs["dual"]["capacity_PV"] = self.model.addLConstr(
+            - (self.PV_availabilities @ dual["limit_PV"]).item() <= self.house_params.cost_PV,
+            name=self._name("capacity_PV")
         )
         
         # objective function
-        self.obj["dual"] = sum(self.vars["dual"]["eq_demand"][i] * self.house_params.demands[i] * self.house_params.total_demand * (1 + self.vars["upper_level"]["delta"][i]) for i in range(self.house_params.hours_num))
+        self.obj["dual"] = dual["eq_demand"] @ self.changed_demands
 
     def add_aux_constrs(self) -> None:
+        primal = self.vars["primal"]
+        dual = self.vars["dual"]
+        aux = self.vars["aux"]
         self.constrs["aux"] = {}
-        self.constrs["aux"]["limit_PV"] = self.model.addConstrs(
-            (
-                self.vars["aux"]["limit_PV"][i] == 
-                - self.vars["dual"]["limit_PV"][i] for i in range(self.house_params.hours_num)
-            ),
-            name="aux_limit_PV"
+        self.constrs["aux"]["limit_PV"] = self.model.addConstr(
+            aux["limit_PV"] == - dual["limit_PV"],
+            name=self._name("aux_limit_PV")
         )
 
-        self.constrs["aux"]["limit_battery"] = self.model.addConstrs(
-            (
-                self.vars["aux"]["limit_battery"][i] == 
-                - self.vars["dual"]["limit_battery"][i] for i in range(self.house_params.hours_num)
-            ),
-            name="aux_limit_battery"
+        self.constrs["aux"]["limit_battery"] = self.model.addConstr(
+            aux["limit_battery"] == - dual["limit_battery"],
+            name=self._name("aux_limit_battery")
         )
 
-        self.constrs["aux"]["slack_limit_PV"] = self.model.addConstrs(
-            (
-                self.vars["primal"]["capacity_PV"] * self.house_params.PV_availabilities[i] -
-                self.vars["primal"]["energy_PV"][i] == 
-                self.vars["aux"]["slack_limit_PV"][i] for i in range(self.house_params.hours_num)
-            ),
-            name="slack_limit_PV"
+        self.constrs["aux"]["slack_limit_PV"] = self.model.addConstr(
+            gp.MVar.fromvar(primal["capacity_PV"]) * self.PV_availabilities - primal["energy_PV"] == aux["slack_limit_PV"],
+            name=self._name("slack_limit_PV")
         )
 
-        self.constrs["aux"]["slack_limit_battery"] = self.model.addConstrs(
-            (
-                self.vars["primal"]["capacity_battery"] -
-                self.vars["primal"]["energy_battery"][i] == 
-                self.vars["aux"]["slack_limit_battery"][i] for i in range(self.house_params.hours_num)
-            ),
-            name="slack_limit_battery"
+        self.constrs["aux"]["slack_limit_battery"] = self.model.addConstr(
+            primal["capacity_battery"] - primal["energy_battery"] == aux["slack_limit_battery"],
+            name=self._name("slack_limit_battery")
         )
 
-        self.constrs["aux"]["slack_energy_buy"] = self.model.addConstrs(
-            (
-                self.house_params.cost_buy - self.vars["dual"]["eq_demand"][i] == 
-                self.vars["aux"]["slack_energy_buy"][i] for i in range(self.house_params.hours_num)
-            ),
-            name="slack_energy_buy"
+        self.constrs["aux"]["slack_energy_buy"] = self.model.addConstr(
+            self.house_params.cost_buy - dual["eq_demand"] == aux["slack_energy_buy"],
+            name=self._name("slack_energy_buy")
         )
 
-        self.constrs["aux"]["slack_energy_sell"] = self.model.addConstrs(
-            (
-                self.vars["dual"]["eq_demand"][i] - self.house_params.sell_price == 
-                self.vars["aux"]["slack_energy_sell"][i] for i in range(self.house_params.hours_num)
-            ),
-            name="slack_energy_sell"
+        self.constrs["aux"]["slack_energy_sell"] = self.model.addConstr(
+            dual["eq_demand"] - self.house_params.sell_price == aux["slack_energy_sell"],
+            name=self._name("slack_energy_sell")
         )
 
-        self.constrs["aux"]["slack_energy_battery_out"] = self.model.addConstrs(
-            (
-                self.vars["dual"]["eq_battery"][i] - self.vars["dual"]["eq_demand"][i] == 
-                self.vars["aux"]["slack_energy_battery_out"][i] for i in range(self.house_params.hours_num)
-            ),
-            name="slack_energy_battery_out"
+        self.constrs["aux"]["slack_energy_battery_out"] = self.model.addConstr(
+            dual["eq_battery"] - dual["eq_demand"] == aux["slack_energy_battery_out"],
+            name=self._name("slack_energy_battery_out")
         )
 
-        self.constrs["aux"]["slack_energy_battery_in"] = self.model.addConstrs(
-            (
-                self.vars["dual"]["eq_demand"][i] - self.vars["dual"]["eq_battery"][i] == 
-                self.vars["aux"]["slack_energy_battery_in"][i] for i in range(self.house_params.hours_num)
-            ),
-            name="slack_energy_battery_in"
+        self.constrs["aux"]["slack_energy_battery_in"] = self.model.addConstr(
+            dual["eq_demand"] - dual["eq_battery"] == aux["slack_energy_battery_in"],
+            name=self._name("slack_energy_battery_in")
         )
 
-        self.constrs["aux"]["slack_energy_battery"] = self.model.addConstrs(
-            (
-                - self.vars["dual"]["eq_battery"][i] +
-                self.vars["dual"]["eq_battery"][range(self.house_params.hours_num)[i-1]] - 
-                self.vars["dual"]["limit_battery"][range(self.house_params.hours_num)[i-1]] == 
-                self.vars["aux"]["slack_energy_battery"][i] for i in range(self.house_params.hours_num)
-            ),
-            name="slack_energy_battery"
+        self.constrs["aux"]["slack_energy_battery"] = self.model.addConstr(
+            - dual["eq_battery"] + dual["eq_battery"][self.prev_hours] - dual["limit_battery"][self.prev_hours] == aux["slack_energy_battery"],
+            name=self._name("slack_energy_battery")
         )
 
-        self.constrs["aux"]["slack_energy_PV"] = self.model.addConstrs(
-            (
-                - self.vars["dual"]["eq_demand"][i] -
-                self.vars["dual"]["limit_PV"][i] == 
-                self.vars["aux"]["slack_energy_PV"][i] for i in range(self.house_params.hours_num)
-            ),
-            name="slack_energy_PV"
+        self.constrs["aux"]["slack_energy_PV"] = self.model.addConstr(
+            - dual["eq_demand"] - dual["limit_PV"] == aux["slack_energy_PV"],
+            name=self._name("slack_energy_PV")
         )
 
-        self.constrs["aux"]["slack_capacity_battery"] = self.model.addConstr(
-            (
-                sum(self.vars["dual"]["limit_battery"][i] for i in range(self.house_params.hours_num)) +
-                self.house_params.cost_battery == 
-                self.vars["aux"]["slack_capacity_battery"]
-            ),
-            name="slack_capacity_battery"
+        self.constrs["aux"]["slack_capacity_battery"] = self.model.addLConstr(
+            dual["limit_battery"].sum().item() + self.house_params.cost_battery == aux["slack_capacity_battery"],
+            name=self._name("slack_capacity_battery")
         )
 
-        self.constrs["aux"]["slack_capacity_PV"] = self.model.addConstr(
-            (
-                sum(self.vars["dual"]["limit_PV"][i] * self.house_params.PV_availabilities[i] for i in range(self.house_params.hours_num)) +
-                self.house_params.cost_PV == 
-                self.vars["aux"]["slack_capacity_PV"]
-            ),
-            name="slack_capacity_PV"
+        self.constrs["aux"]["slack_capacity_PV"] = self.model.addLConstr(
+            (self.PV_availabilities @ dual["limit_PV"]).item() + self.house_params.cost_PV == aux["slack_capacity_PV"],
+            name=self._name("slack_capacity_PV")
         )
 
+    def _set_cs_mode(self, mode: str) -> None:
+        # a second reformulation of the complementarity conditions would only encode them twice
+        if self._cs_mode not in (None, mode):
+            raise ValueError(f"the complementarity conditions of this model are already reformulated with {self._cs_mode}, {mode} can't be added")
+        self._cs_mode = mode
+
     def add_bigM_constrs(self, M:float) -> None:
+        # one vector constraint for the variables and one for the slacks of every complementarity condition
+        self._set_cs_mode("bigM")
         self.constrs["bigM"] = {}
-
-        self.constrs["bigM"]["limit_PV"] = {}
-        self.constrs["bigM"]["limit_PV"]["var"] = self.model.addConstrs(
-            (self.vars["aux"]["limit_PV"][i] <= self.vars["cs"]["limit_PV"][i] * M for i in range(self.house_params.hours_num)),
-            name="bigM_limit_PV_var"
-        )
-        self.constrs["bigM"]["limit_PV"]["con"] = self.model.addConstrs(
-            (self.vars["aux"]["slack_limit_PV"][i] <= (1 - self.vars["cs"]["limit_PV"][i]) * M for i in range(self.house_params.hours_num)),
-            name="bigM_limit_PV_con"
-        )
-
-        self.constrs["bigM"]["limit_battery"] = {}
-        self.constrs["bigM"]["limit_battery"]["var"] = self.model.addConstrs(
-            (self.vars["aux"]["limit_battery"][i] <= self.vars["cs"]["limit_battery"][i] * M for i in range(self.house_params.hours_num)),
-            name="bigM_limit_battery_var"
-        )
-        self.constrs["bigM"]["limit_battery"]["con"] = self.model.addConstrs(
-            (self.vars["aux"]["slack_limit_battery"][i] <= (1 - self.vars["cs"]["limit_battery"][i]) * M for i in range(self.house_params.hours_num)),
-            name="bigM_limit_battery_con"
-        )
-
-        self.constrs["bigM"]["energy_buy"] = {}
-        self.constrs["bigM"]["energy_buy"]["var"] = self.model.addConstrs(
-            (self.vars["primal"]["energy_buy"][i] <= self.vars["cs"]["energy_buy"][i] * M for i in range(self.house_params.hours_num)),
-            name="bigM_energy_buy_var"
-        )
-        self.constrs["bigM"]["energy_buy"]["con"] = self.model.addConstrs(
-            (self.vars["aux"]["slack_energy_buy"][i] <= (1 - self.vars["cs"]["energy_buy"][i]) * M for i in range(self.house_params.hours_num)),
-            name="bigM_energy_buy_con"
-        )
-
-        self.constrs["bigM"]["energy_sell"] = {}
-        self.constrs["bigM"]["energy_sell"]["var"] = self.model.addConstrs(
-            (self.vars["primal"]["energy_sell"][i] <= self.vars["cs"]["energy_sell"][i] * M for i in range(self.house_params.hours_num)),
-            name="bigM_energy_sell_var"
-        )
-        self.constrs["bigM"]["energy_sell"]["con"] = self.model.addConstrs(
-            (self.vars["aux"]["slack_energy_sell"][i] <= (1 - self.vars["cs"]["energy_sell"][i]) * M for i in range(self.house_params.hours_num)),
-            name="bigM_energy_sell_con"
-        )
-
-        self.constrs["bigM"]["energy_battery_out"] = {}
-        self.constrs["bigM"]["energy_battery_out"]["var"] = self.model.addConstrs(
-            (self.vars["primal"]["energy_battery_out"][i] <= self.vars["cs"]["energy_battery_out"][i] * M for i in range(self.house_params.hours_num)),
-            name="bigM_energy_battery_out_var"
-        )
-        self.constrs["bigM"]["energy_battery_out"]["con"] = self.model.addConstrs(
-            (self.vars["aux"]["slack_energy_battery_out"][i] <= (1 - self.vars["cs"]["energy_battery_out"][i]) * M for i in range(self.house_params.hours_num)),
-            name="bigM_energy_battery_out_con"
-        )
-        
-        self.constrs["bigM"]["energy_battery_in"] = {}
-        self.constrs["bigM"]["energy_battery_in"]["var"] = self.model.addConstrs(
-            (self.vars["primal"]["energy_battery_in"][i] <= self.vars["cs"]["energy_battery_in"][i] * M for i in range(self.house_params.hours_num)),
-            name="bigM_energy_battery_in_var"
-        )
-        self.constrs["bigM"]["energy_battery_in"]["con"] = self.model.addConstrs(
-            (self.vars["aux"]["slack_energy_battery_in"][i] <= (1 - self.vars["cs"]["energy_battery_in"][i]) * M for i in range(self.house_params.hours_num)),
-            name="bigM_energy_battery_in_con"
-        )
-
-        self.constrs["bigM"]["energy_battery"] = {}
-        self.constrs["bigM"]["energy_battery"]["var"] = self.model.addConstrs(
-            (self.vars["primal"]["energy_battery"][range(self.house_params.hours_num)[i-1]] <= self.vars["cs"]["energy_battery"][i] * M for i in range(self.house_params.hours_num)),
-            name="bigM_energy_battery_var"
-        )
-        self.constrs["bigM"]["energy_battery"]["con"] = self.model.addConstrs(
-            (self.vars["aux"]["slack_energy_battery"][i] <= (1 - self.vars["cs"]["energy_battery"][i]) * M for i in range(self.house_params.hours_num)),
-            name="bigM_energy_battery_con"
-        )
-
-        self.constrs["bigM"]["energy_PV"] = {}
-        self.constrs["bigM"]["energy_PV"]["var"] = self.model.addConstrs(
-            (self.vars["primal"]["energy_PV"][i] <= self.vars["cs"]["energy_PV"][i] * M for i in range(self.house_params.hours_num)),
-            name="bigM_energy_PV_var"
-        )
-        self.constrs["bigM"]["energy_PV"]["con"] = self.model.addConstrs(
-            (self.vars["aux"]["slack_energy_PV"][i] <= (1 - self.vars["cs"]["energy_PV"][i]) * M for i in range(self.house_params.hours_num)),
-            name="bigM_energy_PV_con"
-        )
-
-        self.constrs["bigM"]["capacity_battery"] = {}
-        self.constrs["bigM"]["capacity_battery"]["var"] = self.model.addConstr(
-            self.vars["primal"]["capacity_battery"] <= self.vars["cs"]["capacity_battery"] * M ,
-            name="bigM_capacity_battery_var"
-        )
-        self.constrs["bigM"]["capacity_battery"]["con"] = self.model.addConstr(
-            self.vars["aux"]["slack_capacity_battery"] <= (1 - self.vars["cs"]["capacity_battery"]) * M ,
-            name="bigM_capacity_battery_con"
-        )
-
-        self.constrs["bigM"]["capacity_PV"] = {}
-        self.constrs["bigM"]["capacity_PV"]["var"] = self.model.addConstr(
-            self.vars["primal"]["capacity_PV"] <= self.vars["cs"]["capacity_PV"] * M ,
-            name="bigM_capacity_PV_var"
-        )
-        self.constrs["bigM"]["capacity_PV"]["con"] = self.model.addConstr(
-            self.vars["aux"]["slack_capacity_PV"] <= (1 - self.vars["cs"]["capacity_PV"]) * M ,
-            name="bigM_capacity_PV_con"
-        )
+        bounds = self.bigM_bounds(M)
+        for key, (var, slack, binary) in self.complementarity_pairs().items():
+            M_var, M_slack = bounds[key]
+            self.constrs["bigM"][key] = {}
+            self.constrs["bigM"][key]["var"] = self.model.addConstr(var <= M_var * binary, name=self._name(f"bigM_{key}_var"))
+            self.constrs["bigM"][key]["con"] = self.model.addConstr(slack <= M_slack * (1 - binary), name=self._name(f"bigM_{key}_con"))
         self.model.setParam("IntFeasTol", 1e-9)
-        
-    def add_sos_constrs(self) -> None:
-        self.constrs["sos"] = {}
-        self.constrs["sos"]["limit_PV"] = []
-        for i in range(self.house_params.hours_num):
-            self.constrs["sos"]["limit_PV"].append(
-                self.model.addSOS(GRB.SOS_TYPE1, [self.vars["aux"]["limit_PV"][i],self.vars["aux"]["slack_limit_PV"][i]])
-            )
-        self.constrs["sos"]["limit_battery"] = []
-        for i in range(self.house_params.hours_num):
-            self.constrs["sos"]["limit_battery"].append(
-                self.model.addSOS(GRB.SOS_TYPE1, [self.vars["aux"]["limit_battery"][i],self.vars["aux"]["slack_limit_battery"][i]])
-            )
-        
-        self.constrs["sos"]["energy_buy"] = []
-        for i in range(self.house_params.hours_num):
-            self.constrs["sos"]["energy_buy"].append(
-                self.model.addSOS(GRB.SOS_TYPE1, [self.vars["primal"]["energy_buy"][i],self.vars["aux"]["slack_energy_buy"][i]])
-            )
-        
-        self.constrs["sos"]["energy_sell"] = []
-        for i in range(self.house_params.hours_num):
-            self.constrs["sos"]["energy_sell"].append(
-                self.model.addSOS(GRB.SOS_TYPE1, [self.vars["primal"]["energy_sell"][i],self.vars["aux"]["slack_energy_sell"][i]])
-            )
-        
-        self.constrs["sos"]["energy_battery_out"] = []
-        for i in range(self.house_params.hours_num):
-            self.constrs["sos"]["energy_sell"].append(
-                self.model.addSOS(GRB.SOS_TYPE1, [self.vars["primal"]["energy_battery_out"][i],self.vars["aux"]["slack_energy_battery_out"][i]])
-            )
-        
 
-        self.constrs["sos"]["energy_battery_in"] = []
-        for i in range(self.house_params.hours_num):
-            self.constrs["sos"]["energy_battery_in"].append(
-                self.model.addSOS(GRB.SOS_TYPE1, [self.vars["primal"]["energy_battery_in"][i],self.vars["aux"]["slack_energy_battery_in"][i]])
-            )
-        
-        self.constrs["sos"]["energy_battery"] = []
-        for i in range(self.house_params.hours_num):
-            self.constrs["sos"]["energy_battery"].append(
-                self.model.addSOS(GRB.SOS_TYPE1, [self.vars["primal"]["energy_battery"][range(self.house_params.hours_num)[i-1]],self.vars["aux"]["slack_energy_battery"][i]])
-            )
+    def add_indicator_constrs(self) -> None:
+        # the binary switches the variable or the slack to zero, gurobi picks the reformulation and no M is needed
+        self._set_cs_mode("indicator")
+        self.constrs["indicator"] = {}
+        for key, (var, slack, binary) in self.complementarity_pairs().items():
+            self.constrs["indicator"][key] = {}
+            self.constrs["indicator"][key]["var"] = self.model.addGenConstrIndicator(binary, False, var <= 0, name=self._name(f"indicator_{key}_var"))
+            self.constrs["indicator"][key]["con"] = self.model.addGenConstrIndicator(binary, True, slack <= 0, name=self._name(f"indicator_{key}_con"))
         
-        self.constrs["sos"]["energy_PV"] = []
-        for i in range(self.house_params.hours_num):
-            self.constrs["sos"]["energy_PV"].append(
-                self.model.addSOS(GRB.SOS_TYPE1, [self.vars["primal"]["energy_PV"][i],self.vars["aux"]["slack_energy_PV"][i]])
-            )
+    def add_sos_constrs(self) -> None:
+        self._set_cs_mode("sos")
+        H = self.house_params.hours_num
+        primal, aux = self.vars["primal"], self.vars["aux"]
+        # variable and slack of every hourly complementarity condition, as lists of Vars to index them cheaply
+        # the battery level of the previous hour is complementary to the slack of the battery constraint of this hour
+        pairs = {
+            "limit_PV": (aux["limit_PV"], aux["slack_limit_PV"]),
+            "limit_battery": (aux["limit_battery"], aux["slack_limit_battery"]),
+            "energy_buy": (primal["energy_buy"], aux["slack_energy_buy"]),
+            "energy_sell": (primal["energy_sell"], aux["slack_energy_sell"]),
+            "energy_battery_out": (primal["energy_battery_out"], aux["slack_energy_battery_out"]),
+            "energy_battery_in": (primal["energy_battery_in"], aux["slack_energy_battery_in"]),
+            "energy_battery": (primal["energy_battery"][self.prev_hours], aux["slack_energy_battery"]),
+            "energy_PV": (primal["energy_PV"], aux["slack_energy_PV"]),
+        }
+        pairs = {key: (var.tolist(), slack.tolist()) for key, (var, slack) in pairs.items()}
+        self.constrs["sos"] = {key: [None] * H for key in pairs}
+        for i in range(H):
+            for key, (var, slack) in pairs.items():
+                self.constrs["sos"][key][i] = self.model.addSOS(GRB.SOS_TYPE1, [var[i], slack[i]])
         
-        self.constrs["sos"]["capacity_battery"] = self.model.addSOS(GRB.SOS_TYPE1, [self.vars["primal"]["capacity_battery"],self.vars["aux"]["slack_capacity_battery"]])
-        self.constrs["sos"]["capacity_PV"] = self.model.addSOS(GRB.SOS_TYPE1, [self.vars["primal"]["capacity_PV"],self.vars["aux"]["slack_capacity_PV"]])
+        self.constrs["sos"]["capacity_battery"] = self.model.addSOS(GRB.SOS_TYPE1, [primal["capacity_battery"],aux["slack_capacity_battery"]])
+        self.constrs["sos"]["capacity_PV"] = self.model.addSOS(GRB.SOS_TYPE1, [primal["capacity_PV"],aux["slack_capacity_PV"]])
 
         # https://www.gurobi.com/documentation/9.5/refman/presos1encoding.html#parameter:PreSOS1Encoding
         # to shut off the reformulation PreSOS1BigM parameter should be set to zero
         self.model.setParam("PreSOS1BigM", 0)
 
     def add_valid_ineq_constr(self, ub:list[float]) -> None:
-        self.constrs["valid_ineq"] = self.model.addConstr(
-            self.obj["primal"] <= sum(self.vars["dual"]["eq_demand"][i] * self.house_params.demands[i] * self.house_params.total_demand * (1 + ub[i]) for i in range(self.house_params.hours_num)),
-            name="valid_ineq"
+        coeffs = _demand_coeffs(self.demands, self.house_params.total_demand, 1 + np.asarray(ub, dtype=np.float64))
+        self.constrs["valid_ineq"] = self.model.addLConstr(
+            (self.obj["primal"] - coeffs @ self.vars["dual"]["eq_demand"]).item() <= 0,
+            name=self._name("valid_ineq")
         )
 
-    def fix_vars(self, name: str, fix_value:float|None = None) -> None:
+    def complementarity_pairs(self) -> dict[str, tuple[gp.MVar, gp.MVar, gp.MVar]]:
+        # nonnegative variable, slack of its constraint and binary of every complementarity condition
+        # the battery level of the previous hour is complementary to the slack of the battery constraint of this hour
+        primal, aux, cs = self.vars["primal"], self.vars["aux"], self.vars["cs"]
+        return {
+            "limit_PV": (aux["limit_PV"], aux["slack_limit_PV"], cs["limit_PV"]),
+            "limit_battery": (aux["limit_battery"], aux["slack_limit_battery"], cs["limit_battery"]),
+            "energy_buy": (primal["energy_buy"], aux["slack_energy_buy"], cs["energy_buy"]),
+            "energy_sell": (primal["energy_sell"], aux["slack_energy_sell"], cs["energy_sell"]),
+            "energy_battery_out": (primal["energy_battery_out"], aux["slack_energy_battery_out"], cs["energy_battery_out"]),
+            "energy_battery_in": (primal["energy_battery_in"], aux["slack_energy_battery_in"], cs["energy_battery_in"]),
+            "energy_battery": (primal["energy_battery"][self.prev_hours], aux["slack_energy_battery"], cs["energy_battery"]),
+            "energy_PV": (primal["energy_PV"], aux["slack_energy_PV"], cs["energy_PV"]),
+            "capacity_battery": tuple(gp.MVar.fromlist([var]) for var in (primal["capacity_battery"], aux["slack_capacity_battery"], cs["capacity_battery"])),
+            "capacity_PV": tuple(gp.MVar.fromlist([var]) for var in (primal["capacity_PV"], aux["slack_capacity_PV"], cs["capacity_PV"])),
+        }
+
+    def bigM_bounds(self, M: float) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        # bounds of the variable and the slack of every complementarity pair, in the shapes of complementarity_pairs
+        # one side of each pair belongs to the dual, whose feasible set is bounded by the prices, the primal side only by M
+        hp = self.house_params
+        H = hp.hours_num
+        price_gap = hp.cost_buy - hp.sell_price # eq_demand lies between the prices and eq_battery equals it
+        # -limit_PV is bounded by the PV capacity constraint in the hours with sun and by nothing without sun
+        limit_PV = np.full(H, np.inf)
+        sunny = self.PV_availabilities > 0
+        limit_PV[sunny] = hp.cost_PV / self.PV_availabilities[sunny]
+        dual_bounds = {
+            "limit_PV": limit_PV,
+            "limit_battery": np.full(H, hp.cost_battery), # -limit_battery sums up to at most cost_battery
+            "energy_buy": np.full(H, price_gap),
+            "energy_sell": np.full(H, price_gap),
+            "energy_battery_out": np.full(H, price_gap),
+            "energy_battery_in": np.full(H, price_gap),
+            "energy_battery": np.full(H, price_gap + hp.cost_battery),
+            "energy_PV": limit_PV - hp.sell_price,
+            "capacity_battery": np.array([hp.cost_battery]),
+            "capacity_PV": np.array([hp.cost_PV]),
+        }
+        bounds = {}
+        for key, bound in dual_bounds.items():
+            M_primal, M_dual = np.full(bound.shape, M), np.minimum(M, bound)
+            # the multipliers of the limits are the variables of their pairs, everywhere else the dual side is the slack
+            bounds[key] = (M_dual, M_primal) if key in ("limit_PV", "limit_battery") else (M_primal, M_dual)
+        return bounds
+
+    def lazy_bigM_callback(self, M:float, tol:float = 1e-6):
+        # the bigM constraints are only added as lazy cuts when an incumbent violates them
+        self._set_cs_mode("lazyBigM")
+        bounds = self.bigM_bounds(M)
+        pairs = [(*pair, *bounds[key]) for key, pair in self.complementarity_pairs().items()]
+        self.model.setParam("LazyConstraints", 1)
+        self.model.setParam("IntFeasTol", 1e-9)
+        def callback(model, where):
+            if where != GRB.Callback.MIPSOL:
+                return
+            for var, slack, binary, M_var, M_slack in pairs:
+                var_value, slack_value, binary_value = model.cbGetSolution(var), model.cbGetSolution(slack), model.cbGetSolution(binary)
+                for i in np.flatnonzero(var_value > binary_value * M_var + tol):
+                    model.cbLazy(var[i].item() <= binary[i].item() * M_var[i])
+                for i in np.flatnonzero(slack_value > (1 - binary_value) * M_slack + tol):
+                    model.cbLazy(slack[i].item() <= (1 - binary[i].item()) * M_slack[i])
+        return callback
+
+    def add_sd_constr(self) -> None:
+        # strong duality replaces the complementarity constraints, weak duality gives the other direction
+        # the dual objective is bilinear in delta and eq_demand, so the constraint is a nonconvex quadratic one
+        self._set_cs_mode("sd")
+        self.constrs["sd"] = self.model.addConstr(
+            self.obj["primal"] <= self.obj["dual"],
+            name=self._name("strong_duality")
+        )
+
+    def fix_vars(self, name: str, fix_value:float|dict[str, float | np.ndarray]|None = None) -> None:
+        # fixes the group to its solution, to one value or to values in the form of get_values
         var_list = []
         for value in self.vars[name].values():
-            if isinstance(value,gp.tupledict):
-                var_list.extend(list(value.values()))
+            if isinstance(value,gp.MVar):
+                var_list.extend(value.tolist())
             elif isinstance(value,gp.Var):
                 var_list.append(value)
             else:
                 raise Exception("it should not happen")
-        constr_list = []
-        self.constrs["fix"][name] = constr_list
-        for var in var_list:
-            if fix_value is None:
-                constr_list.append(self.model.addConstr(var.X == var))
-            else:
-                constr_list.append(self.model.addConstr(fix_value == var))
+        if fix_value is None:
+            values = self.model.getAttr("X", var_list)
+        elif isinstance(fix_value, dict):
+            values = np.concatenate([np.atleast_1d(fix_value[key]) for key in self.vars[name]]).tolist()
+        else:
+            values = [fix_value] * len(var_list)
+        # fix through the bounds, the original ones are kept to release the variables again
+        # the bounds of a model that was never solved are only readable after an update,
+        # a solved model is not updated since that would discard the solution read above
+        if self.model.Status == GRB.LOADED:
+            self.model.update()
+        self.constrs["fix"][name] = (var_list, self.model.getAttr("LB", var_list), self.model.getAttr("UB", var_list))
+        self.model.setAttr("LB", var_list, values)
+        self.model.setAttr("UB", var_list, values)
+
+    def set_start(self, name: str, values: dict[str, float | np.ndarray]) -> None:
+        # MIP start of the variables of a group, e.g. with the output of get_values of another model
+        for key, value in values.items():
+            self.vars[name][key].Start = value
 
     def release_vars(self, name:str) -> None:
-        for con in self.constrs["fix"][name]:
-            self.model.remove(con)
-        del self.constrs["fix"][name]
+        var_list, lb, ub = self.constrs["fix"].pop(name)
+        self.model.setAttr("LB", var_list, lb)
+        self.model.setAttr("UB", var_list, ub)
     
     def set_obj(self, name:str) -> None:
         sense = None
@@ -542,85 +598,187 @@ class HouseModel():
         self.model.setObjective(self.obj[name], sense)
     
     def set_PADM_obj(self, mu:float) -> None:
-        self.model.setObjective(self.obj["upper_level"] + mu * (self.obj["primal"] - self.obj["dual"]), GRB.MINIMIZE)
+        # the duality gap is built on the first call, later calls only scale it with the new penalty
+        if "duality_gap" not in self.obj:
+            self.obj["duality_gap"] = self.obj["primal"] - self.obj["dual"]
+        self.model.setObjective(self.obj["upper_level"] + mu * self.obj["duality_gap"], GRB.MINIMIZE)
     
     def set_valid_ineq_obj(self, i:int) -> None:
-        self.model.setObjective(self.vars["upper_level"]["delta"][i], GRB.MAXIMIZE)
+        # after the first hour only two objective coefficients change, the previous delta and this one
+        delta = self.vars["upper_level"]["delta"]
+        if self._valid_ineq_hour is None:
+            self.model.setObjective(delta[i].item(), GRB.MAXIMIZE)
+        else:
+            delta[self._valid_ineq_hour].item().Obj = 0
+            delta[i].item().Obj = 1
+        self._valid_ineq_hour = i
 
     def get_obj_value(self, name:str = None) -> float:
         if name is None:
             return self.model.getObjective().getValue()
         else:
-            return self.obj[name].getValue()
+            return float(self.obj[name].getValue())
 
-    def solve(self) -> None:
-        self.model.optimize()
+    def solve(self, callback=None) -> None:
+        self.model.optimize(callback)
         return self.model.status
     
-    def get_values(self, name:str) -> dict[str, list[float]]:
+    def get_values(self, name:str) -> dict[str, float | np.ndarray]:
         output = {}
         for key, value in self.vars[name].items():
-            if isinstance(value, gp.Var):
+            if isinstance(value, (gp.Var, gp.MVar)):
                 output[key] = value.X
-            elif isinstance(value, gp.tupledict):
-                output[key] = []
-                for index, var in value.items():
-                    output[key].append(var.X)
         return output
     
-    def get_demands(self):
-        return [self.house_params.total_demand *  self.house_params.demands[i] for i in range(self.house_params.hours_num)]
-        # self.house_params.total_demand * 
-    def get_changed_demands(self):
-        return [self.house_params.total_demand * (self.house_params.demands[i] *(1+ self.vars["upper_level"]["delta"][i].X)) for i in range(self.house_params.hours_num)]
+    def get_demands(self) -> np.ndarray:
+        return self.scaled_demands.copy()
+
+    def get_changed_demands(self) -> np.ndarray:
+        return self.scaled_demands * (1 + self.vars["upper_level"]["delta"].X)
 
 class Control():
-    def __init__(self, house_params: HouseParams, attack_params: AttackParams) -> None:
+    def __init__(self, house_params: HouseParams, attack_params: AttackParams, solver_params: dict[str, float|int|str]|None = None, debug_names: bool = False) -> None:
         self.house_params = house_params
+        self.debug_names = debug_names
         self.attack_params = attack_params
+        self.solver_params = solver_params # gurobi parameters set on every model, e.g. {"Threads": 4}
+        self._primal_cache = None # solution of primal_model, used as MIP start of the attacks
+        self._base = None # model with the primal and the dual part, shared by primal_model and dual_model
+        self._attack_models = {} # built attack models, re-seeded by set_attack_params instead of rebuilt
+        self._PADM_start = None # iterates of the first PADM solve, they only change with the attack
+        self._ub_valid_ineq = None # result of get_ub_valid_ineq, it only changes with the attack
     
+    def set_attack_params(self, attack_params: AttackParams) -> None:
+        # the built models only get new bounds and right hand sides, a new norm needs new models
+        if attack_params.norm != self.attack_params.norm:
+            self._attack_models.clear()
+            self._base = None
+            self._primal_cache = None
+        self._PADM_start = None
+        self._ub_valid_ineq = None
+        for hm in self._attack_models.values():
+            hm.apply_attack(attack_params)
+        if self._base is not None:
+            self._base.apply_attack(attack_params)
+        self.attack_params = attack_params
+
     @staticmethod
-    def diff_values(values_A: dict[str, float | list[float]], values_B: dict[str, float | list[float]]) -> float:
-        max_diff = -float('inf')
-        for key in values_A:
-            if isinstance(values_A[key], int) or isinstance(values_A[key], float):
-                list_A = np.array((values_A[key],))
-                list_B = np.array((values_B[key],))
-            else:
-                list_A = np.array(values_A[key])
-                list_B = np.array(values_B[key])
-            list_diff = max(list_A - list_B)
-            max_diff = max(max_diff, list_diff)
-        return max_diff
+    def diff_values(values_A: dict[str, float | np.ndarray], values_B: dict[str, float | np.ndarray]) -> float:
+        # largest absolute change of any value of the group, scalars and hourly arrays flattened into one array
+        list_A = np.concatenate([np.atleast_1d(values_A[key]) for key in values_A]).astype(np.float64, copy=False)
+        list_B = np.concatenate([np.atleast_1d(values_B[key]) for key in values_A]).astype(np.float64, copy=False)
+        return float(_max_abs_diff(list_A, list_B))
+
+    def _base_model(self, with_dual: bool = False) -> HouseModel:
+        # the primal and the dual part do not share constraints, so one model serves both with its objective swapped
+        # the dual part is only added once dual_model asks for it, primal_model alone solves the primal LP
+        if self._base is None:
+            hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params, solver_params=self.solver_params, debug_names=self.debug_names)
+            hm.configure("LP")
+            hm.add_upper_level_vars()
+            hm.add_primal_vars()
+            hm.add_primal_constrs()
+            self._base = hm
+        if with_dual and "dual" not in self._base.vars:
+            self._base.add_dual_vars()
+            self._base.add_dual_constrs()
+        return self._base
 
     def primal_model(self):
-        hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params)
-        hm.add_vars()
-        hm.add_primal_constrs()
+        hm = self._base_model()
         hm.fix_vars("upper_level", 0)
         hm.set_obj("primal")
         hm.solve()
-        print(hm.get_values("primal")["capacity_battery"])
-        print(hm.get_values("primal")["capacity_PV"])
+        self._primal_cache = {"primal": hm.get_values("primal"), "upper_level": hm.get_values("upper_level")}
+        hm.release_vars("upper_level")
+        print(self._primal_cache["primal"]["capacity_battery"])
+        print(self._primal_cache["primal"]["capacity_PV"])
     
     def dual_model(self):
-        hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params)
-        hm.add_vars()
-        hm.add_dual_constrs()
+        hm = self._base_model(with_dual=True)
         hm.fix_vars("upper_level", 0)
         hm.set_obj("dual")
         hm.solve()
         hm.get_values("dual")
+        hm.release_vars("upper_level")
     
+    def _set_primal_start(self, hm: HouseModel) -> None:
+        # the unattacked primal solution is a natural start for the attack, no demand is changed
+        if self._primal_cache is not None:
+            for name, values in self._primal_cache.items():
+                hm.set_start(name, values)
+
     def bigM_attack(self, M):
-        hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params)
-        hm.add_vars()
-        hm.add_upper_level_constrs()
-        hm.add_primal_constrs()
-        hm.add_dual_constrs()
-        hm.add_aux_constrs()
-        hm.add_bigM_constrs(M)
-        hm.set_obj("upper_level")
+        hm = self._attack_models.get(("bigM", M))
+        if hm is None:
+            hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params, solver_params=self.solver_params, debug_names=self.debug_names)
+            hm.configure("MILP")
+            hm.add_vars()
+            hm.add_upper_level_constrs()
+            hm.add_primal_constrs()
+            hm.add_dual_constrs()
+            hm.add_aux_constrs()
+            hm.add_bigM_constrs(M)
+            hm.set_obj("upper_level")
+            self._attack_models[("bigM", M)] = hm
+        self._set_primal_start(hm)
+        hm.solve()
+        print(hm.get_obj_value("primal"))
+        print(hm.get_obj_value("dual"))
+        print(hm.get_values("primal")["capacity_battery"])
+        print(hm.get_values("primal")["capacity_PV"])
+        return {
+            "demands": hm.get_demands(),
+            "changed_demands": hm.get_changed_demands(),
+            "PV": hm.get_values("primal")["energy_PV"],
+            "battery": hm.get_values("primal")["energy_battery"],
+            "buy": hm.get_values("primal")["energy_buy"],
+            "sell": hm.get_values("primal")["energy_sell"]
+        }
+
+    def lazy_bigM_attack(self, M):
+        # bigM attack where the complementarity constraints are separated in a callback instead of added upfront
+        hm = self._attack_models.get(("lazyBigM", M))
+        if hm is None:
+            hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params, solver_params=self.solver_params, debug_names=self.debug_names)
+            hm.configure("MILP")
+            hm.add_vars()
+            hm.add_upper_level_constrs()
+            hm.add_primal_constrs()
+            hm.add_dual_constrs()
+            hm.add_aux_constrs()
+            hm.set_obj("upper_level")
+            self._attack_models[("lazyBigM", M)] = hm
+        self._set_primal_start(hm)
+        hm.solve(hm.lazy_bigM_callback(M))
+        print(hm.get_obj_value("primal"))
+        print(hm.get_obj_value("dual"))
+        print(hm.get_values("primal")["capacity_battery"])
+        print(hm.get_values("primal")["capacity_PV"])
+        return {
+            "demands": hm.get_demands(),
+            "changed_demands": hm.get_changed_demands(),
+            "PV": hm.get_values("primal")["energy_PV"],
+            "battery": hm.get_values("primal")["energy_battery"],
+            "buy": hm.get_values("primal")["energy_buy"],
+            "sell": hm.get_values("primal")["energy_sell"]
+        }
+
+    def indicator_attack(self):
+        # complementarity through indicator constraints on the binaries of the bigM attack
+        hm = self._attack_models.get("indicator")
+        if hm is None:
+            hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params, solver_params=self.solver_params, debug_names=self.debug_names)
+            hm.configure("MILP")
+            hm.add_vars()
+            hm.add_upper_level_constrs()
+            hm.add_primal_constrs()
+            hm.add_dual_constrs()
+            hm.add_aux_constrs()
+            hm.add_indicator_constrs()
+            hm.set_obj("upper_level")
+            self._attack_models["indicator"] = hm
+        self._set_primal_start(hm)
         hm.solve()
         print(hm.get_obj_value("primal"))
         print(hm.get_obj_value("dual"))
@@ -636,14 +794,48 @@ class Control():
         }
 
     def sos_attack(self):
-        hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params)
-        hm.add_vars()
-        hm.add_upper_level_constrs()
-        hm.add_primal_constrs()
-        hm.add_dual_constrs()
-        hm.add_aux_constrs()
-        hm.add_sos_constrs()
-        hm.set_obj("upper_level")
+        hm = self._attack_models.get("sos")
+        if hm is None:
+            hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params, solver_params=self.solver_params, debug_names=self.debug_names)
+            hm.configure("MILP")
+            hm.add_upper_level_vars()
+            hm.add_primal_vars()
+            hm.add_dual_vars()
+            hm.add_aux_vars()
+            hm.add_upper_level_constrs()
+            hm.add_primal_constrs()
+            hm.add_dual_constrs()
+            hm.add_aux_constrs()
+            hm.add_sos_constrs()
+            hm.set_obj("upper_level")
+            self._attack_models["sos"] = hm
+        self._set_primal_start(hm)
+        hm.solve()
+        print(hm.get_obj_value("primal"))
+        print(hm.get_obj_value("dual"))
+        return {
+            "demands": hm.get_demands(),
+            "changed_demands": hm.get_changed_demands(),
+            "PV": hm.get_values("primal")["energy_PV"],
+            "battery": hm.get_values("primal")["energy_battery"],
+            "buy": hm.get_values("primal")["energy_buy"],
+        }
+    
+    def sd_attack(self):
+        hm = self._attack_models.get("sd")
+        if hm is None:
+            hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params, solver_params=self.solver_params, debug_names=self.debug_names)
+            hm.configure("MIQCP")
+            hm.add_upper_level_vars()
+            hm.add_primal_vars()
+            hm.add_dual_vars()
+            hm.add_upper_level_constrs()
+            hm.add_primal_constrs()
+            hm.add_dual_constrs()
+            hm.add_sd_constr()
+            hm.set_obj("upper_level")
+            self._attack_models["sd"] = hm
+        self._set_primal_start(hm)
         hm.solve()
         print(hm.get_obj_value("primal"))
         print(hm.get_obj_value("dual"))
@@ -656,21 +848,31 @@ class Control():
         }
     
     def get_ub_valid_ineq(self) -> list[float]:
-        hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params)
+        # the bounds only depend on the attack, set_attack_params drops them
+        if self._ub_valid_ineq is not None:
+            return self._ub_valid_ineq
+        hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params, solver_params=self.solver_params, debug_names=self.debug_names)
+        hm.configure("LP_sequence")
         hm.model.Params.LogToConsole = 0
-        hm.add_vars()
-        hm.add_upper_level_constrs()
+        hm.add_upper_level_vars()
+        hm.add_primal_vars()
+        hm.add_upper_level_constrs(with_abs=False)
         hm.add_primal_constrs()
         ub = []
-        for i in range(len(self.house_params.demands)):
+        for i in range(self.house_params.hours_num):
             hm.set_valid_ineq_obj(i)
             hm.solve()
-            ub.append(hm.get_obj_value())
+            ub.append(hm.model.ObjVal)
+        self._ub_valid_ineq = ub
         return ub
 
     def sos_valid_ineq_attack(self):
-        hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params)
-        hm.add_vars()
+        hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params, solver_params=self.solver_params, debug_names=self.debug_names)
+        hm.configure("MILP")
+        hm.add_upper_level_vars()
+        hm.add_primal_vars()
+        hm.add_dual_vars()
+        hm.add_aux_vars()
         hm.add_upper_level_constrs()
         hm.add_primal_constrs()
         hm.add_dual_constrs()
@@ -683,29 +885,46 @@ class Control():
         print(hm.get_obj_value("dual"))
     
     def PADM_attack(self, PADM_params: PADM_Params):
-        hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params)
-        hm.model.Params.LogToConsole = 0
-        hm.add_vars()
-        hm.add_upper_level_constrs()
-        hm.add_primal_constrs()
-        hm.add_dual_constrs()
-        hm.set_obj("upper_level")
-        hm.solve()
-        primal_values = hm.get_values("primal")
-        dual_values = hm.get_values("dual")
-        upper_level_values = hm.get_values("upper_level")
+        # the model and the solution of its first solve only depend on the attack, runs with other PADM_params reuse them
+        hm = self._attack_models.get("PADM")
+        if hm is None:
+            hm = HouseModel(house_params=self.house_params, attack_params=self.attack_params, solver_params=self.solver_params, debug_names=self.debug_names)
+            hm.model.Params.LogToConsole = 0
+            hm.add_upper_level_vars()
+            hm.add_primal_vars()
+            hm.add_dual_vars()
+            hm.add_upper_level_constrs()
+            hm.add_primal_constrs()
+            hm.add_dual_constrs()
+            self._attack_models["PADM"] = hm
+        if self._PADM_start is None:
+            hm.set_obj("upper_level")
+            hm.solve()
+            self._PADM_start = {name: hm.get_values(name) for name in ("primal", "dual", "upper_level")}
+        primal_values = self._PADM_start["primal"]
+        dual_values = self._PADM_start["dual"]
+        upper_level_values = self._PADM_start["upper_level"]
         mu = PADM_params.initial_mu
+        prev_gap = None # relative duality gap of the previous penalty iteration
+        prev_values = {} # the iterates before the last inner iteration, for the extrapolated start
         j = 0 # outer loop counter
         while True:
             j += 1
-            print(f"j = {j}")
+            if PADM_params.verbose:
+                print(f"j = {j}")
             i = 0 # inner loop counter
             while True:
                 i += 1
-                print(f"i = {i}")
+                if PADM_params.verbose:
+                    print(f"i = {i}")
                 hm.set_PADM_obj(mu)
+                # the duality gap makes the subproblems nonconvex, the last iterate is their start
+                for name, values in (("primal", primal_values), ("dual", dual_values), ("upper_level", upper_level_values)):
+                    if PADM_params.momentum and name in prev_values:
+                        values = {key: value + PADM_params.momentum * (value - prev_values[name][key]) for key, value in values.items()}
+                    hm.set_start(name, values)
                 # fix dual and solve
-                hm.fix_vars("dual")
+                hm.fix_vars("dual", dual_values)
                 hm.solve()
                 new_primal_values = hm.get_values("primal")
                 new_upper_level_values = hm.get_values("upper_level")
@@ -724,6 +943,7 @@ class Control():
                 dual_diff = self.diff_values(dual_values, new_dual_values)
                 upper_level_diff = self.diff_values(upper_level_values, new_upper_level_values)
                 diff = max(primal_diff, dual_diff, upper_level_diff)
+                prev_values = {"primal": primal_values, "dual": dual_values, "upper_level": upper_level_values}
                 primal_values = new_primal_values
                 dual_values = new_dual_values
                 upper_level_values = new_upper_level_values
@@ -731,10 +951,12 @@ class Control():
                     break
             primal_obj_value = hm.get_obj_value("primal")
             dual_obj_value = hm.get_obj_value("dual")
-            if abs((primal_obj_value - dual_obj_value)/primal_obj_value) < PADM_params.penalty_error or j >= PADM_params.max_penalty_iter:
+            gap = abs((primal_obj_value - dual_obj_value)/primal_obj_value)
+            if gap < PADM_params.penalty_error or j >= PADM_params.max_penalty_iter:
                 break
-            else:
+            if prev_gap is None or gap > PADM_params.theta * prev_gap:
                 mu *= PADM_params.increase_factor
+            prev_gap = gap
         print(hm.get_obj_value("upper_level"))
         print(hm.get_obj_value("primal"))
         print(hm.get_obj_value("dual"))